@@ -16,57 +16,107 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
+import os
+import re
+import stat
+
 from gi.repository import Gtk
 
+_SCHEME_RE = re.compile(r"^https?://")
 
-class AkamaiLib:
+
+def sanitize_domain(domain):
     """
-    A class that provides methods for interacting with DNS to obtain the Akamai Staging IP.
-    for a given domain and to spoof the /etc/hosts file to direct the host computer to the
-    Akamai Staging network.
+    Sanitizes the given domain by removing URL schemes and any paths.
+
+    Args:
+        domain (str): The domain to be sanitized.
+
+    Returns:
+        tuple: The sanitized domain and a status message describing the change,
+            left to the caller to emit alongside its other status lines.
     """
+    # Remove URL schemes and any paths
+    scheme = _SCHEME_RE.match(domain)
+    sanitized_domain = domain[scheme.end():] if scheme else domain
+    slash = sanitized_domain.find("/")
+    if slash >= 0:
+        sanitized_domain = sanitized_domain[:slash]
 
-    def sanitize_domain(self, domain, status_label):
-        """
-        Sanitizes the given domain by removing URL schemes and any paths.
+    return (
+        sanitized_domain,
+        f"Original domain {domain} modified to {sanitized_domain}",
+    )
 
-        Args:
-            domain (str): The domain to be sanitized.
-            status_label: The textview widget to print messages to.
 
-        Returns:
-            str: The sanitized domain.
-        """
-        # Remove URL schemes and any paths
-        sanitized_domain = (
-            domain.replace("http://", "").replace("https://", "").split("/")[0]
-        )
+def _insert_textview(widget, message):
+    # Always append at the end; clicking or selecting text in the view moves
+    # the insert mark even though it is not editable.
+    buffer = widget.get_buffer()
+    buffer.insert(buffer.get_end_iter(), message + "\n")
+
 
-        # Print messages related to domain sanitization
-        self.print_to_textview(
-            status_label, f"Original domain {domain} modified to {sanitized_domain}"
+def _set_label(widget, message):
+    widget.set_text(message)
+
+
+# Output handlers keyed on widget type, looked up once per message.
+_HANDLERS = {
+    Gtk.TextView: _insert_textview,
+    Gtk.Label: _set_label,
+}
+
+
+def print_to_textview(widget, message):
+    """
+    Prints a message to the specified widget.
+
+    Args:
+        widget: The widget to print the message to.
+        message (str): The message to be printed.
+
+    Raises:
+        ValueError: If the widget type is not supported.
+    """
+    widget_type = type(widget)
+    handler = _HANDLERS.get(widget_type)
+    if handler is None:
+        # Subclasses such as GtkSource.View use their base class's handler;
+        # remember the match so the next lookup is exact.
+        handler = next(
+            (h for base, h in _HANDLERS.items() if isinstance(widget, base)), None
         )
+        if handler is None:
+            raise ValueError(f"Unsupported widget type: {widget_type}")
+        _HANDLERS[widget_type] = handler
+    handler(widget, message)
 
-        return sanitized_domain
 
-    @staticmethod
-    def print_to_textview(widget, message):
-        """
-        Prints a message to the specified widget.
+def log_batch(widget, messages):
+    """
+    Prints several messages to the specified widget with a single insert.
 
-        Args:
-            widget: The widget to print the message to.
-            message (str): The message to be printed.
+    Args:
+        widget: The widget to print the messages to.
+        messages (list): The messages to be printed, in order.
 
-        Raises:
-            ValueError: If the widget type is not supported.
-        """
-        if isinstance(widget, Gtk.TextView):
-            buffer = widget.get_buffer()
-            end_iter = buffer.get_end_iter()
-            buffer.insert(end_iter, message + "\n")
-        else:
-            raise ValueError(f"Unsupported widget type: {type(widget)}")
+    Raises:
+        ValueError: If the widget type is not supported.
+    """
+    if messages:
+        print_to_textview(widget, "\n".join(messages))
+
+
+class AkamaiLib:
+    """
+    A class that provides methods for interacting with DNS to obtain the Akamai Staging IP.
+    for a given domain and to spoof the /etc/hosts file to direct the host computer to the
+    Akamai Staging network.
+    """
+
+    sanitize_domain = staticmethod(sanitize_domain)
+    print_to_textview = staticmethod(print_to_textview)
+    log_batch = staticmethod(log_batch)
 
     def update_hosts_file(self, domain, ip_address):
         """
@@ -96,13 +146,78 @@ class AkamaiLib:
         Raises:
             IOError: If there is an error accessing or modifying the /etc/hosts file.
         """
-        try:
-            with open("/etc/hosts", "r", encoding="utf-8") as hosts_file:
-                lines = hosts_file.readlines()
+        self.remove_many({domain})
 
-            with open("/etc/hosts", "w", encoding="utf-8") as hosts_file:
-                for line in lines:
-                    if domain not in line:
-                        hosts_file.write(line)
+    def remove_many(self, domains):
+        """
+        Removes the entries for all of the given domains from the /etc/hosts file
+        in a single pass over the file.
+
+        Args:
+            domains (set): The domains to be removed.
+
+        Raises:
+            IOError: If there is an error accessing or modifying the /etc/hosts file.
+        """
+        # /etc/hosts is ASCII in practice, so filter raw bytes and skip the
+        # decode/encode round trip.
+        encoded_domains = {domain.lower().encode() for domain in domains}
+        try:
+            with open("/etc/hosts", "rb") as hosts_file:
+                # Take the metadata from the descriptor we already hold instead
+                # of a second path lookup later.
+                hosts_stat = os.fstat(hosts_file.fileno())
+                original = hosts_file.readlines()
+            kept = [
+                line
+                for line in original
+                if not self._is_entry_for(line, encoded_domains)
+            ]
+            # Nothing to remove, so skip the temp file, fsync and rename.
+            if len(kept) == len(original):
+                return
+
+            # Write to a sibling file and rename it over /etc/hosts so a failed
+            # write never leaves a truncated hosts file behind.
+            tmp_path = "/etc/hosts.akstaging.tmp"
+            try:
+                with open(tmp_path, "wb") as tmp_file:
+                    tmp_file.write(b"".join(kept))
+                    tmp_file.flush()
+                    os.fsync(tmp_file.fileno())
+                    # Only touch ownership and mode when the new file differs, which
+                    # is rare when running as root.
+                    tmp_stat = os.fstat(tmp_file.fileno())
+                    if (tmp_stat.st_uid, tmp_stat.st_gid) != (
+                        hosts_stat.st_uid,
+                        hosts_stat.st_gid,
+                    ):
+                        os.fchown(tmp_file.fileno(), hosts_stat.st_uid, hosts_stat.st_gid)
+                    if stat.S_IMODE(tmp_stat.st_mode) != stat.S_IMODE(hosts_stat.st_mode):
+                        os.fchmod(tmp_file.fileno(), stat.S_IMODE(hosts_stat.st_mode))
+                os.replace(tmp_path, "/etc/hosts")
+            except OSError:
+                # Don't leave a half-written temp file behind in /etc.
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
         except IOError as e:
             raise IOError(f"Error modifying /etc/hosts file: {e}") from e
+
+    @staticmethod
+    def _is_entry_for(line, domains):
+        """
+        Checks whether a hosts file line maps one of the given domains.
+
+        Args:
+            line (bytes): A line from the /etc/hosts file.
+            domains (set): The encoded, lowercased domains to look for.
+
+        Returns:
+            bool: True if any hostname on the line, aliases included, is one of
+                the domains.
+        """
+        hostnames = line.split(b"#", 1)[0].lower().split()[1:]
+        return not domains.isdisjoint(hostnames)
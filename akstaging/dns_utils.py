@@ -1,154 +1,462 @@
-import socket
+import functools
+import os
+import re
+import time
 import dns.exception
+import dns.rdatatype
 import dns.resolver
 
-from akstaging.aklib import AkamaiLib as akl
+# Upper bound on how long a positive answer is trusted, whatever its TTL.
+MAX_CACHE_TTL = 3600
+# How long NXDOMAIN answers are remembered.
+NEGATIVE_CACHE_TTL = 30
+# Most real CNAME chains are at most 6 hops; anything longer is treated as broken.
+MAX_CNAME_CHAIN = 6
+
+# (domain, nameservers) -> (cname or exception, expiry)
+_cname_cache = {}
+# (staging hostname, nameservers) -> (ip, expiry)
+_ip_cache = {}
+# path -> (st_mtime_ns, nameservers) parsed from a resolv.conf
+_resolv_cache = {}
+
+
+def _cache_get(cache, key):
+    """
+    Looks up an unexpired entry in one of the resolver caches.
+
+    Args:
+        cache (dict): The cache to look in.
+        key: The cache key.
+
+    Returns:
+        The cached value, or None if it is missing or has expired.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    value, expires = entry
+    if time.monotonic() >= expires:
+        # pop() rather than del: resolve_many worker threads may expire the
+        # same entry at once.
+        cache.pop(key, None)
+        return None
+    return value
+
+
+def _cache_put(cache, key, value, ttl):
+    """
+    Stores a value in one of the resolver caches.
+
+    Args:
+        cache (dict): The cache to store into.
+        key: The cache key.
+        value: The value to cache.
+        ttl (float): How long, in seconds, the value stays valid.
+    """
+    cache[key] = (value, time.monotonic() + ttl)
+
+
+def _ignore_status(_message):
+    """
+    Default status reporter that discards the message.
+    """
+
+
+@functools.lru_cache(maxsize=8)
+def _get_resolver(nameservers, timeout, lifetime):
+    """
+    Builds a resolver for a set of nameservers, reusing it on later calls.
+
+    Args:
+        nameservers (tuple): The nameservers to query.
+        timeout (float): Seconds to wait for a single nameserver.
+        lifetime (float): Seconds to wait for a query across all nameservers.
+
+    Returns:
+        dns.resolver.Resolver: The shared resolver for these settings.
+    """
+    resolver = dns.resolver.Resolver(configure=False)
+    resolver.timeout = timeout
+    resolver.lifetime = lifetime
+    resolver.nameservers = list(nameservers)
+    return resolver
 
 
 class DNSUtils:
-    CNAME_SUFFIXES = ["edgesuite.net", "edgekey.net"]
+    CNAME_SUFFIXES = ("edgesuite.net", "edgekey.net")
+    # Finds which suffix matched, on a label boundary.
+    _AK_RE = re.compile(
+        rf"\.({'|'.join(re.escape(suffix) for suffix in CNAME_SUFFIXES)})$"
+    )
+    # suffix -> (length, staging suffix), e.g. "edgekey.net" -> (11, "edgekey-staging.net")
+    _STAGING_SUFFIXES = {
+        suffix: (len(suffix), f"{service}-staging.{tld}")
+        for suffix in CNAME_SUFFIXES
+        for service, tld in [suffix.split(".", 1)]
+    }
+    # Status messages for lookup failures that need more than the generic one.
+    _CNAME_ERRORS = {
+        dns.resolver.NoAnswer: "The DNS response does not contain a CNAME record for {domain}.",
+    }
+    # Seconds to wait for a single nameserver, and for a whole query across all
+    # of them, so a dead server fails fast instead of stalling the GUI.
+    RESOLVER_TIMEOUT = 1.0
+    RESOLVER_LIFETIME = 3.0
 
     def configure_dns_resolver(self, dns_server=None):
         """
         Configures and returns a DNS resolver.
 
+        Resolvers are cached per nameserver list and shared between callers, so
+        the returned resolver must not be modified.
+
         Args:
             dns_server (str, optional): The DNS server to be used. Defaults to None.
 
         Returns:
             dns.resolver.Resolver: The configured DNS resolver.
         """
-        resolver = dns.resolver.Resolver(configure=False)
         if dns_server:
-            resolver.nameservers = [dns_server]
+            nameservers = (dns_server,)
         else:
-            self.configure_default_dns(resolver)
-        return resolver
+            nameservers = tuple(self._default_nameservers())
+        return _get_resolver(nameservers, self.RESOLVER_TIMEOUT, self.RESOLVER_LIFETIME)
 
-    def configure_default_dns(self, resolver):
+    def _default_nameservers(self):
         """
-        Configures the default DNS server for the resolver.
+        Returns the nameservers listed in /etc/resolv.conf.
 
-        Args:
-            resolver (dns.resolver.Resolver): The resolver to be configured.
+        The file is only reparsed when its modification time changes.
+
+        Returns:
+            list: The nameserver addresses.
 
         Raises:
             FileNotFoundError: If the /etc/resolv.conf file is not found.
         """
+        path = "/etc/resolv.conf"
         try:
-            with open("/etc/resolv.conf", "r", encoding="utf-8") as resolv_conf:
-                for line in resolv_conf:
-                    if line.startswith("nameserver"):
-                        resolver.nameservers.append(line.split()[1])
+            mtime_ns = os.stat(path).st_mtime_ns
+            cached = _resolv_cache.get(path)
+            if cached is None or cached[0] != mtime_ns:
+                with open(path, "r", encoding="utf-8") as resolv_conf:
+                    nameservers = [
+                        line.split()[1]
+                        for line in resolv_conf
+                        if line.startswith("nameserver")
+                    ]
+                cached = _resolv_cache[path] = (mtime_ns, nameservers)
+            return cached[1]
         except FileNotFoundError as e:
             raise FileNotFoundError(f"Error reading /etc/resolv.conf: {e}") from e
 
-    def get_akamai_cname(self, domain, status_textview):
+    def get_akamai_cname(self, domain, report=_ignore_status, resolver=None):
         """
         Retrieves the CNAME record for the given domain.
 
         Args:
             domain (str): The domain to retrieve the CNAME for.
-            status_textview: The textview widget to print messages to.
+            report (callable, optional): Called with each status message, e.g.
+                list.append to collect them. Defaults to discarding them.
+            resolver (dns.resolver.Resolver, optional): The resolver to use.
+                Defaults to a newly configured one.
 
         Returns:
-            str: The CNAME record.
+            tuple: The CNAME record and the Akamai suffix it matched, e.g.
+                ("www.example.com.edgekey.net", "edgekey.net").
 
         Raises:
             ValueError: If the CNAME does not match Akamai's expected suffixes.
             dns.exception.DNSException: If there is an error resolving the CNAME.
         """
-        resolver = self.configure_dns_resolver()
+        if resolver is None:
+            resolver = self.configure_dns_resolver()
         dns_server_ip = (
             resolver.nameservers[0] if resolver.nameservers else "Default system DNS"
         )
-        akl.print_to_textview(
-            status_textview, f"Using DNS server {dns_server_ip} for record retrieval."
-        )
+        report(f"Using DNS server {dns_server_ip} for record retrieval.")
+
+        cache_key = (domain, tuple(resolver.nameservers))
+        cached = _cache_get(_cname_cache, cache_key)
+        if isinstance(cached, dns.exception.DNSException):
+            report(self._cname_error_message(domain, cached))
+            # Same exception as the live lookup raised; drop the traceback from
+            # earlier raises so it does not grow on every cache hit.
+            raise cached.with_traceback(None)
+        if cached is not None:
+            report(f"Found {domain} CNAME'd to {cached[0]} (cached)")
+            return cached
 
         try:
             answers = resolver.resolve(domain, "CNAME")
-            cname = answers[0].target.to_text().strip(".")
-            if not any(cname.endswith(suffix) for suffix in self.CNAME_SUFFIXES):
-                raise ValueError(
-                    f"Invalid CNAME for {domain}. Must end with one of {self.CNAME_SUFFIXES}"
-                )
-            akl.print_to_textview(status_textview, f"Found {domain} CNAME'd to {cname}")
-            return cname
-        except dns.resolver.NoAnswer:
-            akl.print_to_textview(
-                status_textview,
-                f"The DNS response does not contain a CNAME record for {domain}.",
-            )
-            raise dns.exception.DNSException(
-                f"The DNS response does not contain a CNAME record for {domain}."
-            )
-        except (
-            dns.resolver.NoNameservers,
-            dns.resolver.NXDOMAIN,
-            dns.exception.DNSException,
-        ) as e:
-            akl.print_to_textview(
-                status_textview, f"Error resolving CNAME for {domain}. Exception: {e}"
+        except dns.exception.DNSException as e:
+            self._cache_cname_error(cache_key, e)
+            report(self._cname_error_message(domain, e))
+            raise
+        result = self._cname_from_answers(domain, answers, cache_key)
+        report(f"Found {domain} CNAME'd to {result[0]}")
+        return result
+
+    def _cname_from_answers(self, domain, answers, cache_key):
+        """
+        Extracts the Akamai CNAME from a CNAME answer and caches it.
+
+        Shared by the blocking and asyncio lookups so both validate and cache
+        answers the same way.
+
+        Args:
+            domain (str): The domain that was looked up.
+            answers (dns.resolver.Answer): The CNAME answer for the domain.
+            cache_key (tuple): The (domain, nameservers) cache key.
+
+        Returns:
+            tuple: The CNAME record and the Akamai suffix it matched.
+
+        Raises:
+            ValueError: If the CNAME does not match Akamai's expected suffixes.
+        """
+        cname = answers[0].target.to_text(omit_final_dot=True)
+        suffix = self._match_suffix(cname)
+        if suffix is None:
+            raise ValueError(
+                f"Invalid CNAME for {domain}. Must end with one of {self.CNAME_SUFFIXES}"
             )
-            raise dns.exception.DNSException(
-                f"Error resolving CNAME for {domain}. Exception: {e}"
-            ) from e
+        result = (cname, suffix)
+        _cache_put(
+            _cname_cache, cache_key, result, min(answers.rrset.ttl, MAX_CACHE_TTL)
+        )
+        return result
 
-    def get_akamai_staging_ip(self, sanitized_domain, status_textview):
+    @staticmethod
+    def _cache_cname_error(cache_key, error):
+        """
+        Remembers a CNAME lookup failure when it is worth caching.
+
+        Args:
+            cache_key (tuple): The (domain, nameservers) cache key.
+            error (dns.exception.DNSException): The lookup error.
+        """
+        if isinstance(error, dns.resolver.NXDOMAIN):
+            _cache_put(_cname_cache, cache_key, error, NEGATIVE_CACHE_TTL)
+
+    @classmethod
+    def _cname_error_message(cls, domain, error):
+        """
+        Builds the status message for a failed CNAME lookup.
+
+        Args:
+            domain (str): The domain that was looked up.
+            error (dns.exception.DNSException): The lookup error.
+
+        Returns:
+            str: The status message.
+        """
+        return cls._CNAME_ERRORS.get(
+            type(error), "Error resolving CNAME for {domain}. Exception: {error}"
+        ).format(domain=domain, error=error)
+
+    def get_akamai_staging_ip(self, sanitized_domain, report=_ignore_status):
         """
         Retrieves the Akamai staging IP for the given domain.
 
         Args:
             sanitized_domain (str): The sanitized domain.
-            status_textview: The textview widget to print messages to.
+            report (callable, optional): Called with each status message, e.g.
+                list.append to collect them. Defaults to discarding them.
 
         Returns:
             str: The Akamai staging IP.
 
         Raises:
+            ValueError: If the CNAME does not match Akamai's expected suffixes.
             dns.exception.DNSException: If there is an error getting the staging IP.
         """
+        resolver = self.configure_dns_resolver()
         try:
-            cname = self.get_akamai_cname(sanitized_domain, status_textview)
-            modified_cname = f"{cname[:-4]}-staging.net"
-            staging_ip = self.resolve_ip_address(modified_cname)
-            akl.print_to_textview(
-                status_textview,
-                f"Acquired staging IP {staging_ip} for {modified_cname}",
-            )
+            cname, suffix = self.get_akamai_cname(sanitized_domain, report, resolver)
+            modified_cname = self._construct_staging_cname(cname, suffix)
+            staging_ip = self.resolve_ip_address(modified_cname, resolver)
+            report(f"Acquired staging IP {staging_ip} for {modified_cname}")
             return staging_ip
-        except (
-            dns.resolver.NoNameservers,
-            dns.resolver.NXDOMAIN,
-            dns.resolver.NoAnswer,
-            dns.exception.DNSException,
-            ValueError,
-        ) as e:
-            akl.print_to_textview(
-                status_textview,
-                f"Error getting staging IP for {sanitized_domain} -> {e}",
+        except (dns.exception.DNSException, ValueError) as e:
+            report(f"Error getting staging IP for {sanitized_domain} -> {e}")
+            raise
+
+    async def get_akamai_staging_ips(self, domains, max_concurrency=64):
+        """
+        Retrieves the Akamai staging IPs for several domains concurrently.
+
+        Args:
+            domains (list): The sanitized domains.
+            max_concurrency (int, optional): The maximum number of domains resolved
+                at once. Defaults to 64.
+
+        Returns:
+            list: The staging IP for each domain, in the same order as domains. A
+                domain that could not be resolved has its exception in its place.
+        """
+        # Only batch callers need asyncio, so keep it out of GUI startup
+        import asyncio  # pylint: disable=import-outside-toplevel
+        from dns import asyncresolver  # pylint: disable=import-outside-toplevel
+
+        nameservers = tuple(self.configure_dns_resolver().nameservers)
+        resolver = asyncresolver.Resolver(configure=False)
+        resolver.timeout = self.RESOLVER_TIMEOUT
+        resolver.lifetime = self.RESOLVER_LIFETIME
+        resolver.nameservers = list(nameservers)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def resolve_one(domain):
+            # Same caches and checks as get_akamai_staging_ip, so a domain gets
+            # the same answer whichever path looks it up.
+            cname_key = (domain, nameservers)
+            cached = _cache_get(_cname_cache, cname_key)
+            if isinstance(cached, dns.exception.DNSException):
+                raise cached.with_traceback(None)
+            async with semaphore:
+                if cached is None:
+                    try:
+                        answers = await resolver.resolve(domain, "CNAME")
+                    except dns.exception.DNSException as e:
+                        self._cache_cname_error(cname_key, e)
+                        raise
+                    cached = self._cname_from_answers(domain, answers, cname_key)
+                staging_cname = self._construct_staging_cname(*cached)
+                ip_key = (staging_cname, nameservers)
+                ip_address = _cache_get(_ip_cache, ip_key)
+                if ip_address is None:
+                    staging_answers = await resolver.resolve(staging_cname, "A")
+                    ip_address = self._ip_from_answers(
+                        staging_cname, staging_answers, ip_key
+                    )
+                return ip_address
+
+        return await asyncio.gather(
+            *(resolve_one(domain) for domain in domains), return_exceptions=True
+        )
+
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def _match_suffix(cls, cname):
+        """
+        Finds the Akamai suffix a CNAME ends with.
+
+        Results are memoized, since subdomains served by the same Akamai
+        configuration share a CNAME.
+
+        Args:
+            cname (str): The CNAME to check.
+
+        Returns:
+            str: The matched suffix, e.g. edgekey.net, or None if it is not Akamai.
+        """
+        # A single C-level endswith rejects non-Akamai names without the regex
+        if not cname.endswith(cls.CNAME_SUFFIXES):
+            return None
+        match = cls._AK_RE.search(cname)
+        return match.group(1) if match else None
+
+    @classmethod
+    def _construct_staging_cname(cls, cname, suffix):
+        """
+        Builds the staging hostname for an Akamai edge CNAME.
+
+        Args:
+            cname (str): The Akamai CNAME, e.g. www.example.com.edgekey.net.
+            suffix (str): The Akamai suffix the CNAME matched, e.g. edgekey.net.
+
+        Returns:
+            str: The matching staging hostname, e.g. www.example.com.edgekey-staging.net.
+        """
+        suffix_len, staging_suffix = cls._STAGING_SUFFIXES[suffix]
+        return cname[:-suffix_len] + staging_suffix
+
+    def resolve_many(self, hostnames, max_workers=32):
+        """
+        Resolves the IP addresses for several hostnames using a thread pool.
+
+        This is the blocking counterpart of get_akamai_staging_ips for callers
+        that are not running an asyncio event loop.
+
+        Args:
+            hostnames (list): The hostnames to resolve.
+            max_workers (int, optional): The maximum number of concurrent lookups.
+                Defaults to 32.
+
+        Returns:
+            list: The resolved IP addresses, in the same order as hostnames.
+
+        Raises:
+            dns.exception.DNSException: If any of the hostnames cannot be resolved.
+        """
+        # Only batch callers need a thread pool, so keep it out of GUI startup
+        from concurrent.futures import ThreadPoolExecutor  # pylint: disable=import-outside-toplevel
+
+        resolver = self.configure_dns_resolver()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(
+                executor.map(
+                    lambda hostname: self.resolve_ip_address(hostname, resolver),
+                    hostnames,
+                )
             )
-            raise dns.exception.DNSException(
-                f"Error getting staging IP for {sanitized_domain} -> {e}"
-            ) from e
 
-    def resolve_ip_address(self, hostname):
+    def resolve_ip_address(self, hostname, resolver=None):
         """
         Resolves the IP address for the given hostname.
 
         Args:
             hostname (str): The hostname to resolve.
+            resolver (dns.resolver.Resolver, optional): The resolver to use, so the
+                lookup goes to the same nameservers as the CNAME lookup. Defaults
+                to a newly configured one.
 
         Returns:
             str: The resolved IP address.
 
         Raises:
-            socket.gaierror: If there is an error resolving the IP address.
+            dns.exception.DNSException: If there is an error resolving the IP address.
         """
-        try:
-            return socket.gethostbyname(hostname)
-        except socket.gaierror as e:
-            raise socket.gaierror(
-                f"Error resolving IP address for {hostname}: {e}"
-            ) from e
+        if resolver is None:
+            resolver = self.configure_dns_resolver()
+        cache_key = (hostname, tuple(resolver.nameservers))
+        cached = _cache_get(_ip_cache, cache_key)
+        if cached is not None:
+            return cached
+        answers = resolver.resolve(hostname, "A")
+        return self._ip_from_answers(hostname, answers, cache_key)
+
+    @staticmethod
+    def _ip_from_answers(hostname, answers, cache_key):
+        """
+        Extracts the IP address from an A answer and caches it.
+
+        Shared by the blocking and asyncio lookups so both apply the same CNAME
+        chain limit and cache answers the same way.
+
+        Args:
+            hostname (str): The hostname that was looked up.
+            answers (dns.resolver.Answer): The A answer for the hostname.
+            cache_key (tuple): The (hostname, nameservers) cache key.
+
+        Returns:
+            str: The resolved IP address.
+
+        Raises:
+            dns.exception.DNSException: If the answer followed too many CNAMEs.
+        """
+        cname_hops = sum(
+            1 for rrset in answers.response.answer if rrset.rdtype == dns.rdatatype.CNAME
+        )
+        if cname_hops > MAX_CNAME_CHAIN:
+            raise dns.exception.DNSException(
+                f"CNAME chain for {hostname} is {cname_hops} hops, more than {MAX_CNAME_CHAIN}"
+            )
+        ip_address = answers[0].address
+        # Staging A records usually have a much shorter TTL than the CNAME
+        # that led to them, so they expire on their own TTL.
+        _cache_put(
+            _ip_cache, cache_key, ip_address, min(answers.rrset.ttl, MAX_CACHE_TTL)
+        )
+        return ip_address
@@ -16,12 +16,27 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
+import errno
+import os
+import re
 import sys
 from akstaging.aklib import AkamaiLib
 
+# An address, its hostnames and an optional trailing comment, matched in one
+# pass. Comment-only and blank lines do not match.
+_LINE_RE = re.compile(r"^\s*([^\s#]\S*)\s+([^#]*?)\s*(?:#.*)?$")
+# A single whitespace-delimited field of a hosts line.
+_FIELD_RE = re.compile(r"\S+")
+
 
 class HostsFileEdit:
     HOSTS_FILE = "/etc/hosts"
+    READ_CHUNK_SIZE = 256 * 1024
+
+    # ((st_mtime_ns, st_size), lines) from the last full read of HOSTS_FILE.
+    _hosts_cache = None
+    # (lines, {hostname: ip}) built from the cached lines above.
+    _entries_cache = None
 
     def remove_hosts_entry(self, entry):
         """
@@ -35,21 +50,23 @@ class HostsFileEdit:
 
         Raises:
             FileNotFoundError: If the /etc/hosts file is not found.
-            Exception: If there is an error removing the entry.
+            IOError: If there is any other error removing the entry.
         """
         try:
-            with open(self.HOSTS_FILE, "r", encoding="utf-8") as hosts_file:
-                lines = hosts_file.readlines()
-
-            lines = [line for line in lines if entry not in line]
-
-            with open(self.HOSTS_FILE, "w", encoding="utf-8") as hosts_file:
-                hosts_file.writelines(lines)
+            with open(self.HOSTS_FILE, "r+", encoding="utf-8") as hosts_file:
+                original = hosts_file.read().splitlines(keepends=True)
+                lines = [line for line in original if entry not in line]
+                # Leave the file untouched when there was nothing to remove.
+                if len(lines) != len(original):
+                    hosts_file.seek(0)
+                    hosts_file.write("".join(lines))
+                    hosts_file.truncate()
+            self._invalidate_caches()
 
             return f"Removed /etc/hosts entry: {entry}"
-        except FileNotFoundError as e:
-            raise FileNotFoundError(f"Error reading {self.HOSTS_FILE}: {e}") from e
-        except IOError as e:
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise FileNotFoundError(f"Error reading {self.HOSTS_FILE}: {e}") from e
             raise IOError(f"Error removing /etc/hosts entry: {e}") from e
 
     def update_hosts_file_content(
@@ -70,16 +87,20 @@ class HostsFileEdit:
         if existing_ip != staging_ip:
             try:
                 with open(
-                    self.HOSTS_FILE, "a" if not delete else "r", encoding="utf-8"
+                    self.HOSTS_FILE, "a" if not delete else "r+", encoding="utf-8"
                 ) as hosts_file:
                     if delete:
-                        lines = hosts_file.readlines()
-                        lines = [line for line in lines if sanitized_domain not in line]
-                        hosts_file.seek(0)
-                        hosts_file.writelines(lines)
-                        hosts_file.truncate()
+                        original = hosts_file.read().splitlines(keepends=True)
+                        lines = [
+                            line for line in original if sanitized_domain not in line
+                        ]
+                        if len(lines) != len(original):
+                            hosts_file.seek(0)
+                            hosts_file.write("".join(lines))
+                            hosts_file.truncate()
                     else:
                         hosts_file.write(f"{staging_ip} {sanitized_domain}\n")
+                self._invalidate_caches()
 
                 message = f"{'Deleted' if delete else 'Added'} {staging_ip} {sanitized_domain} to /etc/hosts"
                 AkamaiLib.print_to_textview(status_label, message)
@@ -91,6 +112,161 @@ class HostsFileEdit:
             message = f"The obtained IP is the same as the existing IP for {sanitized_domain}. Not updating."
             AkamaiLib.print_to_textview(status_label, message)
 
+    def update_hosts_file_content_batch(self, entries, status_label):
+        """
+        Updates the content of the /etc/hosts file for several domains at once.
+
+        One status line is printed per entry, saying whether it was added,
+        deleted, already in place, or skipped in favour of a later entry for the
+        same domain.
+
+        Args:
+            entries (list): (staging_ip, sanitized_domain, delete) tuples.
+            status_label: The textview widget to print messages to.
+        """
+        AkamaiLib.log_batch(status_label, self.apply_operations(entries))
+
+    def apply_operations(self, operations):
+        """
+        Applies several add and delete operations to the /etc/hosts file with a
+        single read and a single write.
+
+        Args:
+            operations (list): (staging_ip, sanitized_domain, delete) tuples. When a
+                domain appears more than once, the last operation for it wins.
+
+        Returns:
+            list: A status message for each operation, in order, describing what
+                actually happened to its domain.
+
+        Raises:
+            FileNotFoundError: If the /etc/hosts file is not found.
+        """
+        # Lowercased domain -> (domain, desired IP), with None for removals.
+        targets = {}
+        for staging_ip, sanitized_domain, delete in operations:
+            targets[sanitized_domain.lower()] = (
+                sanitized_domain,
+                None if delete else staging_ip,
+            )
+
+        try:
+            with open(self.HOSTS_FILE, "r+", encoding="utf-8") as hosts_file:
+                original = hosts_file.read().splitlines(keepends=True)
+                present = set()
+                removed = set()
+                kept = [
+                    new_line
+                    for new_line in (
+                        self._apply_to_line(line, targets, present, removed)
+                        for line in original
+                    )
+                    if new_line is not None
+                ]
+
+                added = [
+                    f"{ip} {domain}\n"
+                    for key, (domain, ip) in targets.items()
+                    if ip is not None and key not in present
+                ]
+                if added and kept and not kept[-1].endswith("\n"):
+                    kept[-1] += "\n"
+                kept += added
+
+                # Leave the file untouched when it already matches every request.
+                if kept != original:
+                    hosts_file.seek(0)
+                    hosts_file.write("".join(kept))
+                    hosts_file.truncate()
+            self._invalidate_caches()
+        except FileNotFoundError as e:
+            raise FileNotFoundError(
+                f"Error reading/writing {self.HOSTS_FILE}: {e}"
+            ) from e
+
+        return self._operation_messages(operations, present, removed)
+
+    @staticmethod
+    def _operation_messages(operations, present, removed):
+        """
+        Describes what apply_operations did for each requested operation.
+
+        Args:
+            operations (list): (staging_ip, sanitized_domain, delete) tuples.
+            present (set): Lowercased domains already mapped to their desired IP.
+            removed (set): Lowercased domains that had entries dropped.
+
+        Returns:
+            list: A status message for each operation, in order.
+        """
+        last = {
+            sanitized_domain.lower(): index
+            for index, (_, sanitized_domain, _) in enumerate(operations)
+        }
+        messages = []
+        for index, (staging_ip, sanitized_domain, delete) in enumerate(operations):
+            key = sanitized_domain.lower()
+            if last[key] != index:
+                message = f"Skipped {sanitized_domain}: a later request for it replaces this one."
+            elif delete:
+                message = (
+                    f"Deleted {sanitized_domain} from /etc/hosts"
+                    if key in removed
+                    else f"No /etc/hosts entry for {sanitized_domain}. Not deleting."
+                )
+            elif key not in present:
+                message = f"Added {staging_ip} {sanitized_domain} to /etc/hosts"
+            elif key in removed:
+                message = f"Removed stale /etc/hosts entries for {sanitized_domain}; {staging_ip} was already set."
+            else:
+                message = f"The obtained IP is the same as the existing IP for {sanitized_domain}. Not updating."
+            messages.append(message)
+        return messages
+
+    def _apply_to_line(self, line, targets, present, removed):
+        """
+        Applies the requested mappings to a single /etc/hosts line.
+
+        Args:
+            line (str): A line from the /etc/hosts file, with its line ending.
+            targets (dict): Lowercased domain -> (domain, desired IP or None).
+            present (set): Collects the lowercased domains found already mapped
+                to their desired IP.
+            removed (set): Collects the lowercased domains dropped from the line.
+
+        Returns:
+            str: The line to keep, rewritten without any stale or deleted
+                hostnames, or None if none of its hostnames are left.
+        """
+        if self._parse_hosts_line(line.rstrip("\r\n")) is None:
+            return line
+        # Work on the original text so the spacing, line ending and any
+        # trailing comment survive when only some names are dropped.
+        entry = line.split("#", 1)[0]
+        ip_field, *hostname_fields = _FIELD_RE.finditer(entry)
+        pieces = []
+        start = previous_end = ip_field.end()
+        for field in hostname_fields:
+            cut_from, previous_end = previous_end, field.end()
+            key = field.group().lower()
+            target = targets.get(key)
+            if target is None:
+                continue
+            if target[1] == ip_field.group():
+                # Already mapped to the right IP; keep it where it is.
+                present.add(key)
+            else:
+                # Cut the stale or deleted name together with the whitespace
+                # in front of it.
+                pieces.append(entry[start:cut_from])
+                start = field.end()
+                removed.add(key)
+        if not pieces:
+            return line
+        if len(pieces) == len(hostname_fields):
+            return None
+        return entry[: ip_field.end()] + "".join(pieces) + line[start:]
+
     def get_existing_ip_for_domain(self, sanitized_domain):
         """
         Retrieves the existing IP address for the given domain from the /etc/hosts file.
@@ -102,14 +278,93 @@ class HostsFileEdit:
             str: The existing IP address if found, otherwise None.
         """
         try:
-            with open(self.HOSTS_FILE, "r", encoding="utf-8") as hosts_file:
-                for line in hosts_file:
-                    line_parts = line.split()
-                    if len(line_parts) >= 2:
-                        ip, hostname = line_parts[0], " ".join(line_parts[1:])
-                        if hostname == sanitized_domain:
-                            return ip
+            return self._hosts_entries().get(sanitized_domain.lower())
         except FileNotFoundError as e:
             print(f"Error reading {self.HOSTS_FILE}: {e}")
             sys.exit(1)
-        return None
+
+    def _hosts_entries(self):
+        """
+        Maps every hostname in the /etc/hosts file to its IP address. The map is
+        rebuilt only when the cached lines from _read_hosts_lines change.
+
+        Returns:
+            dict: Each lowercased hostname, aliases included, keyed to the IP
+                address of the first entry that lists it.
+
+        Raises:
+            FileNotFoundError: If the /etc/hosts file is not found.
+        """
+        lines = self._read_hosts_lines()
+        if self._entries_cache is not None and self._entries_cache[0] is lines:
+            return self._entries_cache[1]
+        entries = {}
+        for line in lines:
+            parsed = self._parse_hosts_line(line)
+            if parsed is not None:
+                for hostname in parsed[1].lower().split():
+                    entries.setdefault(hostname, parsed[0])
+        self._entries_cache = (lines, entries)
+        return entries
+
+    @staticmethod
+    def _parse_hosts_line(line):
+        """
+        Splits a hosts file line into its address and hostnames.
+
+        Args:
+            line (str): A line from the /etc/hosts file.
+
+        Returns:
+            tuple: The IP address and the whitespace-separated hostnames, without
+                any trailing comment, or None if the line holds no entry.
+        """
+        # Most entries are a bare "ip hostname" pair; split those directly
+        # and leave comments, tabs and aliases to the full pattern.
+        if "#" not in line and "\t" not in line and line.count(" ") == 1:
+            ip, _, hostname = line.partition(" ")
+            return (ip, hostname) if ip and hostname else None
+        match = _LINE_RE.match(line)
+        return match.groups() if match else None
+
+    def _invalidate_caches(self):
+        """
+        Drops the cached hosts lines and entries after this instance writes the
+        file. A rewrite of the same size within one timestamp tick would
+        otherwise keep the (st_mtime_ns, st_size) key unchanged.
+        """
+        self._hosts_cache = None
+        self._entries_cache = None
+
+    def _read_hosts_lines(self):
+        """
+        Reads the /etc/hosts file as raw bytes and decodes it once. The result is
+        cached and reused while the file's mtime and size are unchanged.
+
+        Returns:
+            list: The lines of the file, without line endings. Callers must not
+                modify it.
+
+        Raises:
+            FileNotFoundError: If the /etc/hosts file is not found.
+        """
+        fd = os.open(self.HOSTS_FILE, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            # The file rarely changes between clicks, so reuse the last split
+            # while its mtime and size are unchanged.
+            hosts_stat = os.fstat(fd)
+            key = (hosts_stat.st_mtime_ns, hosts_stat.st_size)
+            if self._hosts_cache is not None and self._hosts_cache[0] == key:
+                return self._hosts_cache[1]
+            # Size the first read from fstat so the whole file normally comes
+            # back in one call; keep reading only if that came back short or
+            # the file grew in the meantime.
+            data = os.read(fd, hosts_stat.st_size + 1)
+            if len(data) != hosts_stat.st_size:
+                while chunk := os.read(fd, self.READ_CHUNK_SIZE):
+                    data += chunk
+        finally:
+            os.close(fd)
+        lines = data.decode("utf-8").splitlines()
+        self._hosts_cache = (key, lines)
+        return lines
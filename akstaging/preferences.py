@@ -95,9 +95,10 @@ class Preferences(Adw.PreferencesWindow):
 
     def load_preferences(self):
         """Load preferences from the configuration file."""
-        if os.path.exists(PREFERENCES_FILE):
-            config = configparser.ConfigParser()
-            config.read(PREFERENCES_FILE)
+        config = configparser.ConfigParser()
+        # read() skips a missing file and returns the paths it did read, so a
+        # separate existence check is not needed.
+        if config.read(PREFERENCES_FILE):
             font_size = config.getfloat("Preferences", "font_size", fallback=12)
             self.font_size_adjustment.set_value(font_size)
             dark_theme_enabled = config.getboolean(
@@ -18,6 +18,14 @@ gi.require_version("Adw", "1")
 from gi.repository import Adw, Gdk, Gio, GLib, GObject, Gtk
 
 PREFERENCES_FILE = os.path.expanduser("~/.config/akamai_staging/preferences.conf")
+DOMAIN_PATTERN = re.compile(r"^[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+
+# Hosts file entries that are not ours to display or edit.
+IGNORED_IPS = frozenset(("127.0.0.1", "::1", "255.255.255.255"))
+IGNORED_HOSTNAMES = frozenset(
+    ("localhost", "localhost.localdomain", "localhost6", "localhost6.localdomain6")
+)
+IGNORED_HOSTNAME_WORDS = ("container", "registry", "docker")
 
 # Load and register the resource bundle
 resource_path = RESOURCE_PATH
@@ -25,7 +33,7 @@ try:
     resource = Gio.Resource.load(resource_path)
     Gio.resources_register(resource)
 except GLib.Error as e:
-    logging.error(f"Failed to load resource: {e}")
+    logging.error("Failed to load resource: %s", e)
     sys.exit(1)
 
 # Load CSS styles from the resource bundle
@@ -157,9 +165,8 @@ class AkamaiStagingWindow(Adw.ApplicationWindow):
 
     def load_preferences(self):
         """Load preferences from the configuration file."""
-        if os.path.exists(PREFERENCES_FILE):
-            config = configparser.ConfigParser()
-            config.read(PREFERENCES_FILE)
+        config = configparser.ConfigParser()
+        if config.read(PREFERENCES_FILE):
             dark_theme_enabled = config.getboolean("Preferences", "dark_theme", fallback=True)
             self.apply_theme(dark_theme_enabled)
             # Load and apply font size preference
@@ -200,7 +207,7 @@ class AkamaiStagingWindow(Adw.ApplicationWindow):
 
     def _create_and_append_column(self, title, setup_func, bind_func):
         """Create and append a column helper method."""
-        logger.debug(f"Creating and appending column: {title}")
+        logger.debug("Creating and appending column: %s", title)
         factory = Gtk.SignalListItemFactory()
         factory.connect("setup", setup_func)
         factory.connect("bind", bind_func)
@@ -208,7 +215,7 @@ class AkamaiStagingWindow(Adw.ApplicationWindow):
         column = Gtk.ColumnViewColumn(title=title, factory=factory)
         column.set_expand(True)  # Horizontally expand
         self.column_view_entries.append_column(column)
-        logger.debug(f"Appended column: {title}")
+        logger.debug("Appended column: %s", title)
         return column
 
     def setup_ip_column(self, factory, list_item):
@@ -222,7 +229,7 @@ class AkamaiStagingWindow(Adw.ApplicationWindow):
         logger.debug("Binding data to IP address column")
         label = list_item.get_child()
         obj = list_item.get_item()
-        logger.debug(f"Setting IP label text: {obj.ip}")
+        logger.debug("Setting IP label text: %s", obj.ip)
         label.set_text(obj.ip)
 
     def setup_hostname_column(self, factory, list_item):
@@ -236,50 +243,59 @@ class AkamaiStagingWindow(Adw.ApplicationWindow):
         logger.debug("Binding data to hostname column")
         label = list_item.get_child()
         obj = list_item.get_item()
-        logger.debug(f"Setting hostname label text: {obj.hostname}")
+        logger.debug("Setting hostname label text: %s", obj.hostname)
         label.set_text(obj.hostname)
 
     # Store methods
     def populate_store(self, store):
         """Populate the store with data from the hosts file."""
         logger.debug("Populating store with hosts file data")
-        store.remove_all()  # Clear previous data
         try:
             with open(self.hfe.HOSTS_FILE, "r", encoding="utf-8") as hosts_file:
-                for line in hosts_file:
-                    line = line.strip()  # Remove leading/trailing whitespace
-                    if not line or line.startswith("#"):
-                        continue  # Skip empty lines and comments
-                    line_parts = line.split(maxsplit=1)
-                    ip = line_parts[0]
-                    hostname = line_parts[1] if len(line_parts) > 1 else ""
-                    # Lets add a filter to ignore things that could be in the
-                    # hosts file that we don't want to display or edit as they
-                    # are not related.
-                    if (
-                        ip in ["127.0.0.1", "::1", "255.255.255.255"]
-                        or hostname is None
-                        or any(
-                            word in hostname.lower()
-                            for word in ["container", "registry", "docker"]
-                        )
-                        or hostname.lower()
-                        in [
-                            "localhost",
-                            "localhost.localdomain",
-                            "localhost6",
-                            "localhost6.localdomain6",
-                        ]
-                    ):
-                        continue
-
-                    logger.debug(f"Appending to store: IP={ip}, Hostname={hostname}")
-                    obj = DataObject(ip, hostname)
-                    store.append(obj)
+                rows = [
+                    row
+                    for row in map(self._parse_store_row, hosts_file)
+                    if row is not None
+                ]
         except FileNotFoundError as e:
-            logger.error(f"Error reading {self.hfe.HOSTS_FILE}: {e}")
+            logger.error("Error reading %s: %s", self.hfe.HOSTS_FILE, e)
             sys.exit(1)
 
+        if logger.isEnabledFor(logging.DEBUG):
+            for ip, hostname in rows:
+                logger.debug("Appending to store: IP=%s, Hostname=%s", ip, hostname)
+        # Swap the previous data for the new rows in one splice so the column
+        # view gets a single items-changed signal rather than one per row.
+        store.splice(
+            0,
+            store.get_n_items(),
+            [DataObject(ip, hostname) for ip, hostname in rows],
+        )
+
+    @staticmethod
+    def _parse_store_row(line):
+        """Split a hosts file line into an (ip, hostname) row for the store.
+
+        Returns None for blank lines, comments and entries that are filtered out.
+        """
+        line = line.strip()  # Remove leading/trailing whitespace
+        if not line or line.startswith("#"):
+            return None  # Skip empty lines and comments
+        line_parts = line.split(maxsplit=1)
+        ip = line_parts[0]
+        hostname = line_parts[1] if len(line_parts) > 1 else ""
+        # Lets add a filter to ignore things that could be in the
+        # hosts file that we don't want to display or edit as they
+        # are not related.
+        hostname_lower = hostname.lower()
+        if (
+            ip in IGNORED_IPS
+            or hostname_lower in IGNORED_HOSTNAMES
+            or any(word in hostname_lower for word in IGNORED_HOSTNAME_WORDS)
+        ):
+            return None
+        return ip, hostname
+
     # Event handlers
     def on_entry_domain_activate(self, entry):
         """Handle the Enter key press in the domain entry."""
@@ -292,21 +308,25 @@ class AkamaiStagingWindow(Adw.ApplicationWindow):
         """Handle the Get IP button click."""
         logger.debug("Get IP button clicked")
         domain = entry.get_text()
-        sanitized_domain = self.akl.sanitize_domain(domain, textview_status)
+        sanitized_domain, sanitize_message = self.akl.sanitize_domain(domain)
 
         textview_status.set_margin_top(12)
         text_buffer = textview_status.get_buffer()
         text_buffer.set_text("")  # Clear the text buffer
 
+        # Collect status lines and emit them together once the action is done
+        messages = []
         try:
             print(sanitized_domain)
-            if sanitized_domain and re.match(
-                r"^[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", sanitized_domain
-            ):
+            if sanitized_domain and DOMAIN_PATTERN.match(sanitized_domain):
+                messages.append(sanitize_message)
                 staging_ip = self.ns.get_akamai_staging_ip(
-                    sanitized_domain, textview_status
+                    sanitized_domain, messages.append
                 )
                 if staging_ip:
+                    # The hosts helper prints its own result, so flush first
+                    self.akl.log_batch(textview_status, messages)
+                    messages = []
                     self.hfe.update_hosts_file_content(
                         staging_ip, sanitized_domain, False, textview_status
                     )
@@ -315,19 +335,14 @@ class AkamaiStagingWindow(Adw.ApplicationWindow):
                     # Clear the domain entry text
                     entry.set_text("")
                 else:
-                    self.akl.print_to_textview(
-                        textview_status,
-                        f"Error: Failed to get Akamai Staging IP for {sanitized_domain}",
+                    messages.append(
+                        f"Error: Failed to get Akamai Staging IP for {sanitized_domain}"
                     )
             else:
-                self.akl.print_to_textview(
-                    textview_status, "Invalid domain. Please enter a valid domain."
-                )
+                messages.append("Invalid domain. Please enter a valid domain.")
         except Exception as e:
-            self.akl.print_to_textview(
-                textview_status,
-                f"Error: {e}",
-            )
+            messages.append(f"Error: {e}")
+        self.akl.log_batch(textview_status, messages)
 
     def on_delete_button_clicked(self, button, column_view_entries):
         """Handle the Delete button click."""
@@ -339,7 +354,7 @@ class AkamaiStagingWindow(Adw.ApplicationWindow):
             return
 
         entry = f"{selected_item.ip} {selected_item.hostname}"
-        logger.debug(f"Deleting entry: {entry}")
+        logger.debug("Deleting entry: %s", entry)
         removed_entry = self.hfe.remove_hosts_entry(entry)
         self.populate_store(self.store)
 
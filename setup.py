@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+import functools
 import subprocess
 import sys
 import shutil
@@ -109,6 +110,7 @@ def run_command(cmd):
         sys.exit(1)
 
 
+@functools.lru_cache(maxsize=None)
 def detect_os_and_distro():
     os_type = platform.system()
     if os_type == "Linux":